@@ -0,0 +1,382 @@
+"""
+ArubaOS-Switch session and command-run logic shared by
+aruba_os_switch.py and tools/command_probe/command_probe.py.
+
+Both entry points walk the same command plan over the same pooled
+sessions; they differ only in what they write for each result.
+"""
+
+import atexit
+import functools
+import hashlib
+import re
+import threading
+import time
+from typing import Dict, Any, Iterator, List, NamedTuple, Optional, Tuple
+
+from jinja2 import Template
+
+try:
+    from ._aruba_common import enforce_blocked_keywords, flush_channel
+except ImportError:
+    from _aruba_common import enforce_blocked_keywords, flush_channel
+
+
+# Longest flush_channel wait after each paging-disable command
+PAGING_SETTLE_MAX_MS = 300
+
+
+@functools.lru_cache(maxsize=128)
+def _compile_template(template_str: str) -> Template:
+    return Template(template_str)
+
+
+def render_command(template_str: str, context: Dict[str, Any]) -> str:
+    """Render Jinja-style {{ variables }} in command templates."""
+    return _compile_template(template_str).render(**context)
+
+
+# A 'show vlan' row: leading VLAN ID followed by whitespace. Matched per
+# line on the raw bytes, so the output is never decoded.
+_VLAN_LINE_RE = re.compile(rb"\s*(\d+)(?:\s|$)")
+
+
+def extract_vlan_ids(output_bytes: bytes) -> List[int]:
+    """
+    Extract VLAN IDs from 'show vlan' output.
+    Matches:
+      '  1   DEFAULT_VLAN ...'
+      ' 200  DLR_SERVER_VLAN ...'
+    """
+    return [
+        int(m.group(1))
+        for line in output_bytes.splitlines()
+        if (m := _VLAN_LINE_RE.match(line))
+    ]
+
+
+# -------------------------
+# SSH Execution (Timing-Safe)
+# -------------------------
+
+def connect_aruba_os(host: str, username: str, password: str):
+    # netmiko pulls in paramiko and cryptography; only pay for that
+    # once a session is actually opened
+    from netmiko import ConnectHandler
+
+    return ConnectHandler(
+        device_type="aruba_os",
+        host=host,
+        username=username,
+        password=password,
+        fast_cli=False
+    )
+
+
+def disable_paging(conn, commands: list[str]):
+    for cmd in commands:
+        conn.send_command_timing(cmd)
+        flush_channel(conn, max_ms=PAGING_SETTLE_MAX_MS)
+
+
+class CmdResult(NamedTuple):
+    status: str
+    # raw command output (or error text), UTF-8 encoded
+    output: bytes
+    error: Optional[str]
+    duration_ms: int
+
+
+def execute_command(conn, command: str) -> CmdResult:
+    flush_channel(conn)
+
+    start = time.perf_counter_ns()
+    try:
+        output = conn.send_command_timing(
+            command,
+            strip_prompt=False,
+            strip_command=False
+        )
+        # isspace() answers the same question as strip() without
+        # copying the output
+        status = "success" if output and not output.isspace() else "empty"
+        error = None
+    except Exception as e:
+        output = str(e)
+        status = "failed"
+        error = str(e)
+
+    duration = (time.perf_counter_ns() - start) // 1_000_000
+
+    # Netmiko only hands back str; encode once here and the same buffer
+    # is hashed and written by write_artifact without further copies.
+    return CmdResult(status, output.encode(), error, duration)
+
+
+def split_batch_output(
+    output: str,
+    commands: List[str]
+) -> Optional[List[str]]:
+    """
+    Splits a pasted batch's output at each command's echo line.
+    Returns None unless every echo is found, in order, ending its own
+    line right after a prompt; the caller then falls back to running
+    the commands one by one. Only the first echo may stand on a line
+    of its own (its prompt was consumed before the paste); a bare
+    echo of any later command means the device echoed type-ahead, so
+    output cannot be attributed:
+
+    >>> split_batch_output(
+    ...     "show system\\nshow version\\nSystem Name: sw1\\n"
+    ...     "SW1# show version\\nImage...\\nSW1# ",
+    ...     ["show system", "show version"]
+    ... ) is None
+    True
+    """
+    starts: List[int] = []
+    pos = 0
+    for n, cmd in enumerate(commands):
+        while True:
+            i = output.find(cmd, pos)
+            if i < 0:
+                return None
+            end = i + len(cmd)
+            lead = output[output.rfind("\n", 0, i) + 1:i].rstrip()
+            if end == len(output) or output[end] in "\r\n":
+                if lead.endswith(("#", ">")):
+                    break
+                if not lead:
+                    if n == 0:
+                        break
+                    # a later command echoed bare before the previous
+                    # one's output (type-ahead): not attributable
+                    return None
+            pos = i + 1
+        starts.append(i)
+        pos = end
+
+    # each slice runs from its echo to the next prompt, the same shape
+    # send_command_timing returns for a single command
+    starts.append(len(output))
+    return [output[a:b] for a, b in zip(starts, starts[1:])]
+
+
+def execute_batch(conn, commands: List[str]) -> Optional[List[CmdResult]]:
+    """
+    Sends contract commands as one multi-line paste and splits the
+    output per command. Only the commands themselves are sent; no
+    separator commands are injected. Returns None if the batch fails
+    or cannot be split unambiguously.
+    """
+    flush_channel(conn)
+
+    start = time.perf_counter_ns()
+    try:
+        output = conn.send_command_timing(
+            "\n".join(commands),
+            strip_prompt=False,
+            strip_command=False
+        )
+    except Exception:
+        return None
+
+    parts = split_batch_output(output, commands)
+    if parts is None:
+        return None
+
+    # one round-trip for all; attribute its time evenly
+    duration = (time.perf_counter_ns() - start) // 1_000_000 // len(commands)
+
+    return [
+        CmdResult(
+            "success" if part and not part.isspace() else "empty",
+            part.encode(),
+            None,
+            duration
+        )
+        for part in parts
+    ]
+
+
+def execute_chunk(conn, commands: List[str]) -> List[CmdResult]:
+    """
+    Runs several commands as one pasted batch, falling back to one
+    send per command if the batch fails or cannot be split. A device
+    that echoes the paste as type-ahead gets the fallback, so no
+    output is filed under the wrong command:
+
+    >>> class TypeAhead:
+    ...     def send_command_timing(self, command, **kwargs):
+    ...         if "\\n" in command:
+    ...             return "show system\\nshow version\\nName: sw1\\nSW1# "
+    ...         return f"{command}\\n{command} output\\nSW1# "
+    ...     def read_channel(self):
+    ...         return ""
+    >>> system, version = execute_chunk(
+    ...     TypeAhead(), ["show system", "show version"]
+    ... )
+    >>> system.output
+    b'show system\\nshow system output\\nSW1# '
+    >>> version.output
+    b'show version\\nshow version output\\nSW1# '
+    """
+    results = execute_batch(conn, commands) if len(commands) > 1 else None
+    if results is None:
+        results = [execute_command(conn, cmd) for cmd in commands]
+    return results
+
+
+# -------------------------
+# SSH Session Pool
+# -------------------------
+
+# Authenticated sessions keyed by _pool_key. Reusing them skips the SSH
+# handshake + AAA login on repeated runs in the same process.
+_SSH_POOL: Dict[Tuple[str, str, str], Any] = {}
+_SSH_POOL_LOCK = threading.Lock()
+
+
+def _pool_key(host: str, username: str, password: str) -> Tuple[str, str, str]:
+    # A session is only handed back to the credentials that opened it;
+    # the password is kept as a digest, not in clear text.
+    digest = hashlib.sha256(password.encode()).hexdigest()
+    return host, username, digest
+
+
+def _close_quietly(conn) -> None:
+    try:
+        conn.disconnect()
+    except Exception:
+        pass
+
+
+def acquire_connection(host: str, username: str, password: str):
+    """Take an idle pooled session for these credentials, or open one."""
+    with _SSH_POOL_LOCK:
+        conn = _SSH_POOL.pop(_pool_key(host, username, password), None)
+
+    if conn is not None:
+        if conn.is_alive():
+            return conn
+        _close_quietly(conn)
+
+    return connect_aruba_os(host, username, password)
+
+
+def release_connection(host: str, username: str, password: str, conn) -> None:
+    """Return a session to the pool; a surplus session is closed."""
+    key = _pool_key(host, username, password)
+    with _SSH_POOL_LOCK:
+        if key not in _SSH_POOL:
+            _SSH_POOL[key] = conn
+            return
+    _close_quietly(conn)
+
+
+@atexit.register
+def _drain_pool() -> None:
+    with _SSH_POOL_LOCK:
+        conns = list(_SSH_POOL.values())
+        _SSH_POOL.clear()
+    for conn in conns:
+        _close_quietly(conn)
+
+
+# -------------------------
+# Command Plan
+# -------------------------
+
+class CategoryPlan(NamedTuple):
+    category: str
+    # (command, artifact_name, is_vlan_summary), in YAML order
+    commands: Tuple[Tuple[str, str, bool], ...]
+    # (template, artifact_suffix), expanded per VLAN after commands
+    templates: Tuple[Tuple[str, str], ...]
+
+
+def build_command_plan(command_set: Dict[str, Any]) -> Tuple[CategoryPlan, ...]:
+    """
+    Resolves the per-run decisions once per command set: the VLAN
+    template split, artifact names and the 'show vlan' summary slot.
+    """
+    plan = []
+    for category, entries in command_set["commands"].items():
+        cmds = [entry["command"] for entry in entries]
+
+        if category != "vlans":
+            plan.append(CategoryPlan(
+                category,
+                tuple(
+                    (cmd, f"{category}_{idx}.txt", False)
+                    for idx, cmd in enumerate(cmds, start=1)
+                ),
+                ()
+            ))
+            continue
+
+        plain = [cmd for cmd in cmds if "{{vlan_id}}" not in cmd]
+        plan.append(CategoryPlan(
+            category,
+            tuple(
+                (cmd, "vlan_summary.txt", True)
+                if cmd.strip() == "show vlan"
+                else (cmd, f"{category}_{idx}.txt", False)
+                for idx, cmd in enumerate(plain, start=1)
+            ),
+            tuple(
+                (cmd, "_detail" if "detail" in cmd else "")
+                for cmd in cmds if "{{vlan_id}}" in cmd
+            )
+        ))
+    return tuple(plan)
+
+
+def iter_command_results(
+    conn,
+    plan: CategoryPlan,
+    blocked: list[str],
+    batch_size: int = 0,
+    command_batch_size: int = 0
+) -> Iterator[Tuple[int, str, str, CmdResult]]:
+    """
+    Runs one category's commands in collection order and yields
+    (cmd_index, command, artifact_name, result) for each.
+    command_batch_size / batch_size > 1 paste the plain commands /
+    per-VLAN commands in chunks of that many.
+    """
+    cmd_index = 0
+    vlan_ids: List[int] = []
+
+    # 1) plain commands first (for 'vlans', before expansion)
+    step = max(command_batch_size, 1)
+    for first in range(0, len(plan.commands), step):
+        chunk = plan.commands[first:first + step]
+        cmds = [cmd for cmd, _, _ in chunk]
+        for cmd in cmds:
+            enforce_blocked_keywords(cmd, blocked)
+
+        results = execute_chunk(conn, cmds)
+
+        for (cmd, name, is_summary), result in zip(chunk, results):
+            # extract only once
+            if is_summary and result.status == "success" and not vlan_ids:
+                vlan_ids = extract_vlan_ids(result.output)
+
+            cmd_index += 1
+            yield cmd_index, cmd, name, result
+
+    # 2) template expansion — one artifact per VLAN; VLAN commands
+    #    never fall through to the default naming.
+    step = max(batch_size, 1)
+    for template, suffix in plan.templates:
+        for first in range(0, len(vlan_ids), step):
+            chunk = vlan_ids[first:first + step]
+            cmds = [render_command(template, {"vlan_id": vid}) for vid in chunk]
+            for cmd in cmds:
+                enforce_blocked_keywords(cmd, blocked)
+
+            results = execute_chunk(conn, cmds)
+
+            for vid, cmd, result in zip(chunk, cmds, results):
+                cmd_index += 1
+                yield cmd_index, cmd, f"vlan_{vid}{suffix}.txt", result
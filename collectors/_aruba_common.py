@@ -0,0 +1,291 @@
+"""
+Shared helpers for the Aruba collectors.
+
+Nothing here executes commands; it reads probe artifacts, writes
+collector (and derived) manifests and holds the safety checks and
+channel draining the switch collectors share.
+"""
+
+import dataclasses
+import functools
+import hashlib
+import json
+import os
+import re
+import select
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+SCHEMA_PATH = Path("schemas/command_set.schema.json")
+
+# Concurrent host sessions for run_many. Kept below sshd's MaxStartups
+# (default 10) so parallel logins are never dropped/delayed.
+MAX_CONCURRENT_HOSTS = 8
+
+_READ_WORKERS = 8
+
+# Parsers are pure functions of the artifact bytes, so re-runs over
+# unchanged artifacts are served from cache (see parse_cache). Results
+# are shared between calls and must be treated as read-only.
+PARSE_CACHE_SIZE = 64
+
+# Channel draining: stop once read_channel() comes back empty twice,
+# FLUSH_IDLE_MS apart, and never wait longer than the max.
+FLUSH_IDLE_MS = 20
+FLUSH_MAX_MS = 200
+
+
+def utc_timestamp() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _json_default(obj):
+    # orjson serializes dataclasses natively; the stdlib needs a hand
+    if dataclasses.is_dataclass(obj):
+        return dataclasses.asdict(obj)
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+
+def write_manifest(path: Path, manifest) -> None:
+    if orjson is not None:
+        # One C-level encode straight to bytes, no intermediate str
+        data = orjson.dumps(manifest, option=orjson.OPT_INDENT_2)
+        with open(path, "wb") as f:
+            f.write(data)
+        return
+
+    # Stdlib fallback: stream encoder chunks so the whole document is
+    # never materialized as one string.
+    encoder = json.JSONEncoder(indent=2, default=_json_default)
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(encoder.iterencode(manifest))
+
+
+def build_targets(entries, defaults: dict) -> list:
+    """
+    Expands a hosts-file list (host names or target dicts) into
+    run_collector keyword dicts, missing keys taken from defaults.
+    Raises ValueError naming the first malformed entry.
+    """
+    if not isinstance(entries, list):
+        raise ValueError("expected a list of hosts or target dicts")
+
+    targets = []
+    for i, entry in enumerate(entries, 1):
+        if isinstance(entry, str):
+            entry = {"host": entry}
+        elif not isinstance(entry, dict):
+            raise ValueError(
+                f"entry {i}: expected a host name or a mapping, "
+                f"got {type(entry).__name__}"
+            )
+        if not isinstance(entry.get("host"), str) or not entry["host"]:
+            raise ValueError(f"entry {i}: missing 'host'")
+        targets.append({**defaults, **entry})
+    return targets
+
+
+@functools.lru_cache(maxsize=8)
+def _load_yaml(path: str, mtime_ns: int):
+    # Imported on first use; the AP/controller collectors never parse YAML
+    import yaml
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    with open(path, "rb") as f:
+        return yaml.load(f, Loader=loader)
+
+
+def load_yaml(path: Path):
+    # Parsed once per (path, mtime); the result is shared, so read-only
+    return _load_yaml(str(path), path.stat().st_mtime_ns)
+
+
+def load_schema(path: Path):
+    with path.open() as f:
+        return json.load(f)
+
+
+@functools.lru_cache(maxsize=4)
+def _load_validator(path: str, mtime_ns: int):
+    # Imported on first use, like PyYAML above
+    from jsonschema import Draft202012Validator
+    return Draft202012Validator(load_schema(Path(path)))
+
+
+def _validator():
+    # Keyed on mtime so an edited schema is picked up by long-lived callers
+    return _load_validator(str(SCHEMA_PATH), SCHEMA_PATH.stat().st_mtime_ns)
+
+
+def validate_command_set(data) -> None:
+    validator = _validator()
+    if validator.is_valid(data):
+        return
+    for err in validator.iter_errors(data):
+        print(f"[SCHEMA ERROR] {list(err.path)}: {err.message}")
+    raise SystemExit(1)
+
+
+@functools.lru_cache(maxsize=8)
+def _blocked_matcher(blocked: tuple):
+    """
+    Compiles the blocked keywords once per keyword set into a single
+    matcher that scans a command in one pass: an Aho-Corasick automaton
+    when pyahocorasick is installed, otherwise a regex alternation.
+    """
+    # pyahocorasick silently drops empty words; an empty keyword must
+    # still block everything, so leave that case to the regex.
+    if ahocorasick is not None and all(blocked):
+        automaton = ahocorasick.Automaton()
+        for word in blocked:
+            automaton.add_word(word, word)
+        automaton.make_automaton()
+        return automaton
+    return re.compile("|".join(map(re.escape, blocked)))
+
+
+def find_blocked_keyword(command: str, blocked: list[str]):
+    """Returns the first blocked keyword in the command, or None."""
+    lowered = command.lower()
+    matcher = _blocked_matcher(tuple(blocked))
+
+    if isinstance(matcher, re.Pattern):
+        match = matcher.search(lowered)
+        return match.group(0) if match else None
+    return next((w for _, w in matcher.iter(lowered)), None)
+
+
+def enforce_blocked_keywords(command: str, blocked: list[str]) -> None:
+    word = find_blocked_keyword(command, blocked)
+    if word is not None:
+        raise ValueError(f"Blocked keyword '{word}' detected: {command}")
+
+
+def _wait_readable(conn, timeout_s: float) -> bool:
+    """
+    Blocks until the SSH channel has data or timeout_s passes.
+    Falls back to a plain sleep when there is no selectable channel.
+    """
+    channel = getattr(conn, "remote_conn", None)
+    if channel is None or not hasattr(channel, "fileno"):
+        time.sleep(timeout_s)
+        return True
+
+    readable, _, _ = select.select([channel], [], [], timeout_s)
+    return bool(readable)
+
+
+def flush_channel(
+    conn,
+    idle_ms: int = FLUSH_IDLE_MS,
+    max_ms: int = FLUSH_MAX_MS
+) -> None:
+    """Drain residual output until the channel stays quiet for idle_ms."""
+    deadline = time.monotonic() + max_ms / 1000
+    while time.monotonic() < deadline:
+        if not conn.read_channel():
+            # select wakes on the first byte instead of sleeping out
+            # the whole idle window
+            if not _wait_readable(conn, idle_ms / 1000):
+                return
+            if not conn.read_channel():
+                return
+
+
+def _run_target(run, target: dict):
+    try:
+        run(**target)
+    except Exception as exc:
+        print(f"[FAIL] {target.get('host')}: {exc}")
+        return exc
+    return None
+
+
+def run_many(run, targets: list, max_workers: int = MAX_CONCURRENT_HOSTS):
+    """
+    Calls run(**target) for each target dict on up to max_workers
+    threads. Returns (target, exception or None) in input order, so a
+    host listed twice keeps both results.
+    """
+    max_workers = max(1, min(max_workers, MAX_CONCURRENT_HOSTS))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        errors = pool.map(functools.partial(_run_target, run), targets)
+        return list(zip(targets, errors))
+
+
+def read_manifest(path: Path):
+    data = path.read_bytes()
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def to_text(raw: bytes) -> str:
+    return raw.decode("utf-8", "ignore")
+
+
+def parse_cache(parse):
+    """
+    Memoizes parse(raw) per artifact content. Entries are keyed on the
+    sha256 of raw, so the cache holds parse results but never the
+    artifact bytes themselves.
+    """
+    results = OrderedDict()
+    lock = threading.Lock()
+
+    @functools.wraps(parse)
+    def cached(raw: bytes):
+        key = hashlib.sha256(raw).digest()
+        with lock:
+            if key in results:
+                results.move_to_end(key)
+                return results[key]
+
+        result = parse(raw)
+        with lock:
+            results[key] = result
+            if len(results) > PARSE_CACHE_SIZE:
+                results.popitem(last=False)
+        return result
+
+    cached.cache_clear = results.clear
+    return cached
+
+
+def _read_artifact(entry: os.DirEntry):
+    with open(entry.path, "rb") as f:
+        return entry.name, f.read()
+
+
+def read_artifacts(artifacts_dir: Path):
+    """
+    Returns {filename: raw bytes}. Artifacts are scanned as bytes and
+    only the captured fields are decoded (see to_text).
+    """
+    artifacts = {}
+    try:
+        with os.scandir(artifacts_dir) as it:
+            entries = [
+                e for e in it if e.name.endswith(".txt") and e.is_file()
+            ]
+    except FileNotFoundError:
+        return artifacts
+
+    # Reads release the GIL, so slow storage is waited on concurrently.
+    with ThreadPoolExecutor(max_workers=_READ_WORKERS) as pool:
+        artifacts.update(pool.map(_read_artifact, entries))
+    return artifacts
@@ -1,36 +1,48 @@
 # collectors/aruba_ap.py
 
-import json
 import re
-from datetime import datetime
 from pathlib import Path
 
+try:
+    from ._aruba_common import (
+        parse_cache, read_artifacts, to_text, utc_timestamp,
+        write_manifest,
+    )
+except ImportError:
+    from _aruba_common import (
+        parse_cache, read_artifacts, to_text, utc_timestamp,
+        write_manifest,
+    )
+
 
 COLLECTOR_NAME = "aruba_ap"
 COLLECTOR_VERSION = "1.1"
 
-
-def _load_artifacts(artifact_dir: Path):
-    artifacts = {}
-    for path in artifact_dir.glob("*.txt"):
-        artifacts[path.name] = path.read_text(errors="ignore")
-    return artifacts
+# A prompt line and its terminator. Lines end at \r, \n or \r\n, the
+# same breaks bytes.splitlines() uses, so a prompt-only line never
+# leaves a stray \r behind.
+_PROMPT_LINE_RE = re.compile(
+    rb"(?:^|(?<=[\r\n]))[^\S\r\n]*[0-9a-f]{2}(?::[0-9a-f]{2}){5}#"
+    rb"[^\r\n]*(?:\r\n|\r|\n)?",
+    re.IGNORECASE,
+)
+_MODEL_VERSION_RE = re.compile(rb"MODEL:\s*([^)]+)\).*Version\s+([\w\.\-]+)")
+_UPTIME_RE = re.compile(rb"AP uptime is (.+)")
 
 
-def _strip_prompt_lines(text: str):
+def _strip_prompt_lines(text: bytes):
     """
     Removes CLI prompt lines like:
     bc:9f:e4:c3:f2:82#
+
+    >>> _strip_prompt_lines(b"bc:9f:e4:c3:f2:82#\\rPOE: on\\n")
+    b'POE: on\\n'
     """
-    cleaned = []
-    for line in text.splitlines():
-        if re.match(r"^[0-9a-f]{2}(:[0-9a-f]{2}){5}#", line.strip(), re.IGNORECASE):
-            continue
-        cleaned.append(line)
-    return "\n".join(cleaned)
+    return _PROMPT_LINE_RE.sub(b"", text)
 
 
-def _parse_inventory(text: str):
+@parse_cache
+def _parse_inventory(text: bytes):
     inventory = {
         "os_version": None,
         "model": None,
@@ -41,20 +53,21 @@ def _parse_inventory(text: str):
         return inventory
 
     # Model + OS version
-    m = re.search(r"MODEL:\s*([^)]+)\).*Version\s+([\w\.\-]+)", text)
+    m = _MODEL_VERSION_RE.search(text)
     if m:
-        inventory["model"] = m.group(1).strip()
-        inventory["os_version"] = m.group(2).strip()
+        inventory["model"] = to_text(m.group(1)).strip()
+        inventory["os_version"] = to_text(m.group(2)).strip()
 
     # Uptime
-    u = re.search(r"AP uptime is (.+)", text)
+    u = _UPTIME_RE.search(text)
     if u:
-        inventory["uptime"] = u.group(1).strip()
+        inventory["uptime"] = to_text(u.group(1)).strip()
 
     return inventory
 
 
-def _parse_power(text: str):
+@parse_cache
+def _parse_power(text: bytes):
     power = {}
 
     if not text:
@@ -64,22 +77,23 @@ def _parse_power(text: str):
 
     for line in text.splitlines():
         line = line.strip()
-        if not line or line.startswith("----"):
+        if not line or line.startswith(b"----"):
             continue
-        if ":" not in line:
+        if b":" not in line:
             continue
 
-        key, value = line.split(":", 1)
-        power[key.strip()] = value.strip()
+        key, value = line.split(b":", 1)
+        power[to_text(key).strip()] = to_text(value).strip()
 
     return power
 
 
 def run_collector(artifact_root: str):
+    collected_at = utc_timestamp()
     artifact_root = Path(artifact_root)
     artifacts_dir = artifact_root / "artifacts"
 
-    artifacts = _load_artifacts(artifacts_dir)
+    artifacts = read_artifacts(artifacts_dir)
 
     capabilities = {
         "inventory": "not_supported",
@@ -111,7 +125,7 @@ def run_collector(artifact_root: str):
     manifest = {
         "collector": COLLECTOR_NAME,
         "collector_version": COLLECTOR_VERSION,
-        "collected_at": datetime.utcnow().isoformat() + "Z",
+        "collected_at": collected_at,
         "capabilities": capabilities,
         "parse_notes": parse_notes,
         "inventory": inventory,
@@ -119,7 +133,7 @@ def run_collector(artifact_root: str):
     }
 
     manifest_path = artifact_root / "collector_manifest.json"
-    manifest_path.write_text(json.dumps(manifest, indent=2))
+    write_manifest(manifest_path, manifest)
 
     print("[OK] Aruba AP collection complete")
     print(f"     Manifest: {manifest_path}")
@@ -12,25 +12,70 @@ This collector:
 - Records unsupported capabilities explicitly
 """
 
-import json
 import sys
 import re
+from dataclasses import dataclass
 from pathlib import Path
-from datetime import datetime
+from typing import Optional
+
+try:
+    from ._aruba_common import (
+        parse_cache, read_artifacts, to_text, utc_timestamp,
+        write_manifest,
+    )
+except ImportError:
+    from _aruba_common import (
+        parse_cache, read_artifacts, to_text, utc_timestamp,
+        write_manifest,
+    )
 
 COLLECTOR_NAME = "aruba_controller"
 COLLECTOR_VERSION = "1.1"
 
+_INVENTORY_RE = re.compile(rb"ArubaOS \(MODEL:\s*([^)]+)\), Version ([\d\.]+)")
+_UPTIME_RE = re.compile(rb"Switch uptime is (.+)")
+
+# License table columns are separated by two or more blanks; a single blank
+# may appear inside a column (e.g. the install timestamp).
+_LICENSE_FIELD = rb"(\S+(?:[^\S\r\n]\S+)*)"
+_LICENSE_ROW_RE = re.compile(
+    rb"^(?=[A-Z0-9+/=-]{20})"
+    + rb"[^\S\r\n]{2,}".join([_LICENSE_FIELD] * 5),
+    re.MULTILINE,
+)
+_PROFILE_ROW_RE = re.compile(rb"^(\S+)[^\S\r\n]+\d+", re.MULTILINE)
+_CLIENT_TABLE_RE = re.compile(
+    rb"^(?P<header>[ \t]*IP[^\r\n]*AP name[^\r\n]*)"
+    rb"|^(?P<row>\d+\.\d+\.\d+\.\d+[^\r\n]*)",
+    re.MULTILINE,
+)
+_WORD_RE = re.compile(r"\S+")
+
+# Header column positions kept per client:
+# IP, MAC, Name, Role, Age, AP name, Essid
+_CLIENT_COLUMNS = (0, 1, 2, 3, 4, 7, 9)
+
+
+@dataclass(frozen=True)
+class Client:
+    # Fixed-layout record: user-tables can hold thousands of rows
+    __slots__ = ("ip", "mac", "name", "role", "auth_age", "ap", "essid")
+
+    ip: str
+    mac: str
+    name: Optional[str]
+    role: str
+    auth_age: str
+    ap: str
+    essid: str
+
 
 def load_artifacts(probe_dir: Path):
-    artifacts_dir = probe_dir / "artifacts"
-    artifacts = {}
-    for path in artifacts_dir.glob("*.txt"):
-        artifacts[path.name] = path.read_text(errors="ignore")
-    return artifacts
+    return read_artifacts(probe_dir / "artifacts")
 
 
-def parse_inventory(artifacts):
+@parse_cache
+def parse_inventory(text: bytes):
     inventory = {
         "os_version": None,
         "model": None,
@@ -38,129 +83,121 @@ def parse_inventory(artifacts):
         "serial": None,
     }
 
-    text = artifacts.get("inventory_1.txt", "")
-
-    m = re.search(r"ArubaOS \(MODEL:\s*([^)]+)\), Version ([\d\.]+)", text)
+    m = _INVENTORY_RE.search(text)
     if m:
-        inventory["model"] = m.group(1)
-        inventory["os_version"] = m.group(2)
+        inventory["model"] = to_text(m.group(1))
+        inventory["os_version"] = to_text(m.group(2))
 
-    m = re.search(r"Switch uptime is (.+)", text)
+    m = _UPTIME_RE.search(text)
     if m:
-        inventory["uptime"] = m.group(1).strip()
+        inventory["uptime"] = to_text(m.group(1)).strip()
 
     return inventory
 
 
-def parse_licenses(artifacts):
-    text = artifacts.get("inventory_5.txt", "")
+@parse_cache
+def parse_licenses(text: bytes):
     licenses = []
 
-    if "License Table" not in text:
+    if b"License Table" not in text:
         return licenses
 
-    for line in text.splitlines():
-        if re.match(r"[A-Z0-9+/=-]{20,}", line):
-            parts = re.split(r"\s{2,}", line.strip())
-            if len(parts) >= 5:
-                licenses.append({
-                    "key": parts[0],
-                    "installed": parts[1],
-                    "expires": parts[2],
-                    "flags": parts[3],
-                    "service": parts[4],
-                })
+    for m in _LICENSE_ROW_RE.finditer(text):
+        licenses.append({
+            "key": to_text(m.group(1)),
+            "installed": to_text(m.group(2)),
+            "expires": to_text(m.group(3)),
+            "flags": to_text(m.group(4)),
+            "service": to_text(m.group(5)),
+        })
 
     return licenses
 
 
-def parse_ssids(artifacts):
-    text = artifacts.get("vlans_1.txt", "")
+@parse_cache
+def parse_ssids(text: bytes):
     ssids = []
 
-    if "SSID Profile List" not in text:
+    if b"SSID Profile List" not in text:
         return ssids
 
-    for line in text.splitlines():
-        if re.match(r"\S+\s+\d+", line):
-            name = line.split()[0]
-            if name.lower() != "default":
-                ssids.append(name)
+    for m in _PROFILE_ROW_RE.finditer(text):
+        name = to_text(m.group(1))
+        if name.lower() != "default":
+            ssids.append(name)
 
     return ssids
 
 
-def parse_virtual_aps(artifacts):
-    text = artifacts.get("vlans_2.txt", "")
+@parse_cache
+def parse_virtual_aps(text: bytes):
     vaps = []
 
-    if "Virtual AP profile List" not in text:
+    if b"Virtual AP profile List" not in text:
         return vaps
 
-    for line in text.splitlines():
-        if re.match(r"\S+\s+\d+", line):
-            name = line.split()[0]
-            if name.lower() != "default":
-                vaps.append(name)
+    for m in _PROFILE_ROW_RE.finditer(text):
+        name = to_text(m.group(1))
+        if name.lower() != "default":
+            vaps.append(name)
 
     return vaps
 
 
-def parse_clients(artifacts):
-    text = artifacts.get("mac_table_1.txt", "")
+@parse_cache
+def parse_clients(text: bytes):
     clients = []
 
-    if "Users" not in text:
-        return clients
-
-    lines = text.splitlines()
-
-    header_idx = None
-    for i, line in enumerate(lines):
-        if line.strip().startswith("IP") and "AP name" in line:
-            header_idx = i
-            break
-
-    if header_idx is None:
+    if b"Users" not in text:
         return clients
 
-    header = lines[header_idx]
-    col_starts = [m.start() for m in re.finditer(r"\S+", header)]
-
-    def slice_cols(line):
-        fields = []
-        for i, start in enumerate(col_starts):
-            end = col_starts[i + 1] if i + 1 < len(col_starts) else None
-            fields.append(line[start:end].strip())
-        return fields
-
-    for line in lines[header_idx + 2:]:
-        if not re.match(r"\d+\.\d+\.\d+\.\d+", line):
+    # One scan finds the header and every candidate client row; rows are
+    # only taken from below the separator line that follows the header.
+    header = None
+    rows_start = -1
+    for m in _CLIENT_TABLE_RE.finditer(text):
+        if header is None:
+            if m.group("header") is None:
+                continue
+            header = to_text(m.group("header"))
+
+            col_starts = [c.start() for c in _WORD_RE.finditer(header)]
+            if len(col_starts) <= max(_CLIENT_COLUMNS):
+                break
+            bounds = list(zip(col_starts, col_starts[1:] + [None]))
+            col_ranges = [bounds[i] for i in _CLIENT_COLUMNS]
+
+            header_end = text.find(b"\n", m.end())
+            if header_end == -1:
+                break
+            rows_start = text.find(b"\n", header_end + 1)
+            if rows_start == -1:
+                break
             continue
 
-        cols = slice_cols(line)
-
-        try:
-            clients.append({
-                "ip": cols[0],
-                "mac": cols[1],
-                "name": cols[2] or None,
-                "role": cols[3],
-                "auth_age": cols[4],
-                "ap": cols[7],
-                "essid": cols[9],
-            })
-        except IndexError:
+        row = m.group("row")
+        if row is None or m.start() < rows_start:
             continue
 
+        # Columns are character positions, so slice the decoded row
+        line = to_text(row)
+
+        ip, mac, name, role, auth_age, ap, essid = [
+            line[start:end].strip() for start, end in col_ranges
+        ]
+        clients.append(
+            Client(ip, mac, name or None, role, auth_age, ap, essid)
+        )
+
     return clients
 
 
 def build_manifest(probe_dir: Path, artifacts):
+    collected_at = utc_timestamp()
     manifest = {
         "collector": COLLECTOR_NAME,
         "collector_version": COLLECTOR_VERSION,
-        "collected_at": datetime.utcnow().isoformat() + "Z",
+        "collected_at": collected_at,
         "capabilities": {
             "inventory": "supported",
             "licenses": "supported",
@@ -173,15 +210,15 @@ def build_manifest(probe_dir: Path, artifacts):
             "vlans": "not_supported",
         },
         "parse_notes": [],
-        "inventory": parse_inventory(artifacts),
-        "licenses": parse_licenses(artifacts),
-        "ssids": parse_ssids(artifacts),
-        "virtual_aps": parse_virtual_aps(artifacts),
-        "clients": parse_clients(artifacts),
+        "inventory": parse_inventory(artifacts.get("inventory_1.txt", b"")),
+        "licenses": parse_licenses(artifacts.get("inventory_5.txt", b"")),
+        "ssids": parse_ssids(artifacts.get("vlans_1.txt", b"")),
+        "virtual_aps": parse_virtual_aps(artifacts.get("vlans_2.txt", b"")),
+        "clients": parse_clients(artifacts.get("mac_table_1.txt", b"")),
     }
 
     out_path = probe_dir / "collector_manifest.json"
-    out_path.write_text(json.dumps(manifest, indent=2))
+    write_manifest(out_path, manifest)
     return out_path
 
 
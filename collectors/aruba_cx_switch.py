@@ -17,17 +17,37 @@ Guarantees:
 - Deterministic quarterly layout
 """
 
-import json
-import yaml
 import uuid
 import hashlib
 import time
 from pathlib import Path
 from datetime import datetime, timezone
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 
 from netmiko import ConnectHandler
-from jsonschema import Draft202012Validator
+
+try:
+    from ._aruba_common import (
+        MAX_CONCURRENT_HOSTS,
+        build_targets,
+        enforce_blocked_keywords,
+        flush_channel,
+        load_yaml,
+        run_many,
+        validate_command_set,
+        write_manifest,
+    )
+except ImportError:
+    from _aruba_common import (
+        MAX_CONCURRENT_HOSTS,
+        build_targets,
+        enforce_blocked_keywords,
+        flush_channel,
+        load_yaml,
+        run_many,
+        validate_command_set,
+        write_manifest,
+    )
 
 
 # -------------------------
@@ -35,13 +55,17 @@ from jsonschema import Draft202012Validator
 # -------------------------
 
 COMMAND_SET_PATH = Path("tools/command_probe/command_sets/aruba_cx.yaml")
-SCHEMA_PATH = Path("schemas/command_set.schema.json")
 
 OUTPUT_ROOT = Path("artifacts/aruba_cx_switch")
 
 COLLECTOR_NAME = "aruba_cx_switch_collector"
 COLLECTOR_VERSION = "1.0.0"
 
+# Longest flush_channel wait after each paging-disable command
+PAGING_SETTLE_MAX_MS = 1000
+
+WRITE_CHUNK_CHARS = 64 * 1024
+
 
 # -------------------------
 # Helpers
@@ -51,34 +75,18 @@ def now_utc() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
-def sha256_bytes(data: bytes) -> str:
-    return "sha256:" + hashlib.sha256(data).hexdigest()
-
-
-def load_yaml(path: Path) -> Dict[str, Any]:
-    with path.open() as f:
-        return yaml.safe_load(f)
-
-
-def load_schema(path: Path) -> Dict[str, Any]:
-    with path.open() as f:
-        return json.load(f)
-
-
-def validate_command_set(data: Dict[str, Any], schema: Dict[str, Any]) -> None:
-    validator = Draft202012Validator(schema)
-    errors = list(validator.iter_errors(data))
-    if errors:
-        for err in errors:
-            print(f"[SCHEMA ERROR] {list(err.path)}: {err.message}")
-        raise SystemExit(1)
-
-
-def enforce_blocked_keywords(command: str, blocked: list[str]) -> None:
-    lowered = command.lower()
-    for word in blocked:
-        if word in lowered:
-            raise ValueError(f"Blocked keyword '{word}' detected: {command}")
+def write_artifact(path: Path, text: str) -> str:
+    """
+    Encode, hash and write command output in one pass.
+    Returns the sha256 checksum of the bytes written.
+    """
+    digest = hashlib.sha256()
+    with path.open("wb") as f:
+        for start in range(0, len(text), WRITE_CHUNK_CHARS):
+            chunk = text[start:start + WRITE_CHUNK_CHARS].encode()
+            digest.update(chunk)
+            f.write(chunk)
+    return "sha256:" + digest.hexdigest()
 
 
 # -------------------------
@@ -98,36 +106,33 @@ def connect_aruba_cx(host: str, username: str, password: str):
 def disable_paging(conn, commands: list[str]):
     for cmd in commands:
         conn.send_command_timing(cmd)
-        time.sleep(0.3)
-
-
-def flush_channel(conn):
-    time.sleep(0.2)
-    conn.read_channel()
+        flush_channel(conn, max_ms=PAGING_SETTLE_MAX_MS)
 
 
 def execute_command(conn, command: str) -> Dict[str, Any]:
     flush_channel(conn)
 
-    start = time.time()
+    start = time.perf_counter_ns()
     try:
         output = conn.send_command_timing(
             command,
             strip_prompt=False,
             strip_command=False
         )
-        status = "success" if output.strip() else "empty"
+        # isspace() answers the same question as strip() without
+        # copying the output
+        status = "success" if output and not output.isspace() else "empty"
         error = None
     except Exception as e:
         output = str(e)
         status = "failed"
         error = str(e)
 
-    duration = int((time.time() - start) * 1000)
+    duration = (time.perf_counter_ns() - start) // 1_000_000
 
     return {
         "status": status,
-        "output": output.encode(),
+        "output": output,
         "error": error,
         "duration_ms": duration
     }
@@ -145,9 +150,7 @@ def run_collector(
     quarter: str
 ) -> None:
     command_set = load_yaml(COMMAND_SET_PATH)
-    schema = load_schema(SCHEMA_PATH)
-
-    validate_command_set(command_set, schema)
+    validate_command_set(command_set)
 
     blocked = command_set["safety"]["blocked_keywords"]
 
@@ -173,80 +176,115 @@ def run_collector(
     }
 
     conn = connect_aruba_cx(host, username, password)
-
-    paging_cmds = (
-        command_set
-        .get("transport", {})
-        .get("ssh", {})
-        .get("paging_disable", [])
-    )
-    disable_paging(conn, paging_cmds)
-
-    for category, commands in command_set["commands"].items():
-        manifest["results"].setdefault(
-            category,
-            {"success": [], "failed": []}
+    try:
+        paging_cmds = (
+            command_set
+            .get("transport", {})
+            .get("ssh", {})
+            .get("paging_disable", [])
         )
-
-        for idx, entry in enumerate(commands, start=1):
-            cmd = entry["command"]
-            enforce_blocked_keywords(cmd, blocked)
-
-            result = execute_command(conn, cmd)
-
-            artifact_path = artifacts_dir / f"{category}_{idx}.txt"
-            artifact_path.write_bytes(result["output"])
-            checksum = sha256_bytes(result["output"])
-
-            manifest["artifacts"].append({
-                "category": category,
-                "command": cmd,
-                "path": str(artifact_path),
-                "checksum": checksum,
-                "status": result["status"],
-                "duration_ms": result["duration_ms"]
-            })
-
-            if result["status"] == "success":
-                manifest["results"][category]["success"].append(cmd)
-            else:
-                manifest["results"][category]["failed"].append(cmd)
-
-    conn.disconnect()
+        disable_paging(conn, paging_cmds)
+
+        for category, commands in command_set["commands"].items():
+            manifest["results"].setdefault(
+                category,
+                {"success": [], "failed": []}
+            )
+
+            for idx, entry in enumerate(commands, start=1):
+                cmd = entry["command"]
+                enforce_blocked_keywords(cmd, blocked)
+
+                result = execute_command(conn, cmd)
+
+                artifact_path = artifacts_dir / f"{category}_{idx}.txt"
+                checksum = write_artifact(artifact_path, result["output"])
+
+                manifest["artifacts"].append({
+                    "category": category,
+                    "command": cmd,
+                    "path": str(artifact_path),
+                    "checksum": checksum,
+                    "status": result["status"],
+                    "duration_ms": result["duration_ms"]
+                })
+
+                if result["status"] == "success":
+                    manifest["results"][category]["success"].append(cmd)
+                else:
+                    manifest["results"][category]["failed"].append(cmd)
+    finally:
+        conn.disconnect()
 
     manifest_path = run_dir / "collector_manifest.json"
-    manifest_path.write_text(json.dumps(manifest, indent=2))
+    write_manifest(manifest_path, manifest)
 
     print("[OK] Aruba CX Switch collection complete")
     print(f"     Artifacts: {artifacts_dir}")
     print(f"     Manifest : {manifest_path}")
 
 
+def run_collector_many(
+    targets: List[Dict[str, Any]],
+    max_workers: int = MAX_CONCURRENT_HOSTS
+) -> List[Tuple[Dict[str, Any], Optional[BaseException]]]:
+    """
+    Runs run_collector for each target dict concurrently.
+    Each run writes to its own run_id directory, so runs share no files.
+    """
+    return run_many(run_collector, targets, max_workers)
+
+
 # -------------------------
 # CLI
 # -------------------------
 
 def main():
     import argparse
+    import sys
 
     parser = argparse.ArgumentParser(
         description="Aruba CX Switch Quarterly Collector (Evidence-Based)"
     )
-    parser.add_argument("--host", required=True)
+    hosts = parser.add_mutually_exclusive_group(required=True)
+    hosts.add_argument("--host")
+    hosts.add_argument(
+        "--hosts-file",
+        type=Path,
+        help="YAML/JSON list of hosts or target dicts; "
+             "missing keys default to the CLI values"
+    )
     parser.add_argument("--username", required=True)
     parser.add_argument("--password", required=True)
     parser.add_argument("--site", required=True)
     parser.add_argument("--quarter", required=True)
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=MAX_CONCURRENT_HOSTS
+    )
 
     args = parser.parse_args()
 
-    run_collector(
-        host=args.host,
-        username=args.username,
-        password=args.password,
-        site=args.site,
-        quarter=args.quarter
-    )
+    defaults = {
+        "username": args.username,
+        "password": args.password,
+        "site": args.site,
+        "quarter": args.quarter
+    }
+
+    if args.host:
+        run_collector(host=args.host, **defaults)
+        return
+
+    try:
+        targets = build_targets(load_yaml(args.hosts_file), defaults)
+    except ValueError as exc:
+        parser.error(f"{args.hosts_file}: {exc}")
+
+    results = run_collector_many(targets, max_workers=args.max_workers)
+    if any(err is not None for _, err in results):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -11,19 +11,53 @@ Key behavior:
 - All other behavior unchanged
 """
 
-import json
-import yaml
+import functools
+import os
 import uuid
 import hashlib
-import time
-import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime, timezone
-from typing import Dict, Any, List
-
-from netmiko import ConnectHandler
-from jsonschema import Draft202012Validator
-from jinja2 import Template
+from typing import Dict, Any, List, Optional, Tuple
+
+try:
+    from ._aruba_common import (
+        MAX_CONCURRENT_HOSTS,
+        _load_yaml,
+        build_targets,
+        load_yaml,
+        run_many,
+        validate_command_set,
+        write_manifest,
+    )
+    from ._aos_switch import (
+        CategoryPlan,
+        _close_quietly,
+        acquire_connection,
+        build_command_plan,
+        disable_paging,
+        iter_command_results,
+        release_connection,
+    )
+except ImportError:
+    from _aruba_common import (
+        MAX_CONCURRENT_HOSTS,
+        _load_yaml,
+        build_targets,
+        load_yaml,
+        run_many,
+        validate_command_set,
+        write_manifest,
+    )
+    from _aos_switch import (
+        CategoryPlan,
+        _close_quietly,
+        acquire_connection,
+        build_command_plan,
+        disable_paging,
+        iter_command_results,
+        release_connection,
+    )
 
 
 # -------------------------
@@ -31,13 +65,16 @@ from jinja2 import Template
 # -------------------------
 
 COMMAND_SET_PATH = Path("tools/command_probe/command_sets/aruba_os.yaml")
-SCHEMA_PATH = Path("schemas/command_set.schema.json")
 
 OUTPUT_ROOT = Path("artifacts/aruba_os_switch")
 
 COLLECTOR_NAME = "aruba_os_switch_collector"
 COLLECTOR_VERSION = "1.2.1"
 
+# Hash and write in cache-sized slices so each slice is read from
+# memory once.
+WRITE_CHUNK_BYTES = 64 * 1024
+
 
 # -------------------------
 # Helpers
@@ -47,118 +84,50 @@ def now_utc() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
-def sha256_bytes(data: bytes) -> str:
-    return "sha256:" + hashlib.sha256(data).hexdigest()
-
-
-def load_yaml(path: Path) -> Dict[str, Any]:
-    with path.open() as f:
-        return yaml.safe_load(f)
-
-
-def load_schema(path: Path) -> Dict[str, Any]:
-    with path.open() as f:
-        return json.load(f)
-
-
-def validate_command_set(data: Dict[str, Any], schema: Dict[str, Any]) -> None:
-    validator = Draft202012Validator(schema)
-    errors = list(validator.iter_errors(data))
-    if errors:
-        for err in errors:
-            print(f"[SCHEMA ERROR] {list(err.path)}: {err.message}")
-        raise SystemExit(1)
-
-
-def enforce_blocked_keywords(command: str, blocked: list[str]) -> None:
-    lowered = command.lower()
-    for word in blocked:
-        if word in lowered:
-            raise ValueError(f"Blocked keyword '{word}' detected: {command}")
-
-
-def render_command(template_str: str, context: Dict[str, Any]) -> str:
-    return Template(template_str).render(**context)
-
-
-def extract_vlan_ids(output_bytes: bytes) -> List[int]:
-    text = output_bytes.decode(errors="ignore")
-    ids: List[int] = []
-    for match in re.finditer(r"^\s*(\d+)\s+", text, flags=re.MULTILINE):
-        try:
-            ids.append(int(match.group(1)))
-        except ValueError:
-            continue
-    return ids
+def write_artifact(path: str, data: bytes) -> str:
+    """
+    Hash and write command output in one pass over the buffer.
+    Returns the sha256 checksum of the bytes written.
+    """
+    digest = hashlib.sha256()
+    view = memoryview(data)
+    with open(path, "wb") as f:
+        for start in range(0, len(view), WRITE_CHUNK_BYTES):
+            chunk = view[start:start + WRITE_CHUNK_BYTES]
+            digest.update(chunk)
+            f.write(chunk)
+    return "sha256:" + digest.hexdigest()
 
 
 # -------------------------
-# SSH (Timing-Safe)
+# Collector Core
 # -------------------------
 
-def connect_aruba_os(host: str, username: str, password: str):
-    return ConnectHandler(
-        device_type="aruba_os",
-        host=host,
-        username=username,
-        password=password,
-        fast_cli=False
-    )
-
-
-def disable_paging(conn, commands: list[str]):
-    for cmd in commands:
-        conn.send_command_timing(cmd)
-        time.sleep(0.3)
+@functools.lru_cache(maxsize=8)
+def _command_plan(path: str, mtime_ns: int) -> Tuple[CategoryPlan, ...]:
+    return build_command_plan(_load_yaml(path, mtime_ns))
 
 
-def flush_channel(conn):
-    time.sleep(0.2)
-    conn.read_channel()
+def load_command_set(path: Path):
+    """
+    Loads and validates a command set and returns (command_set, plan).
+    Both are cached per (path, mtime) and shared, so read-only.
+    """
+    key = (str(path), path.stat().st_mtime_ns)
+    command_set = _load_yaml(*key)
+    validate_command_set(command_set)
+    return command_set, _command_plan(*key)
 
 
-def execute_command(conn, command: str) -> Dict[str, Any]:
-    flush_channel(conn)
-
-    start = time.time()
-    try:
-        output = conn.send_command_timing(
-            command,
-            strip_prompt=False,
-            strip_command=False
-        )
-        status = "success" if output.strip() else "empty"
-        error = None
-    except Exception as e:
-        output = str(e)
-        status = "failed"
-        error = str(e)
-
-    duration = int((time.time() - start) * 1000)
-
-    return {
-        "status": status,
-        "output": output.encode(),
-        "error": error,
-        "duration_ms": duration
-    }
-
-
-# -------------------------
-# Collector Core
-# -------------------------
-
 def run_collector(
     host: str,
     username: str,
     password: str,
     site: str,
-    quarter: str
+    quarter: str,
+    vlan_batch_size: int = 0
 ) -> None:
-    command_set = load_yaml(COMMAND_SET_PATH)
-    schema = load_schema(SCHEMA_PATH)
-
-    validate_command_set(command_set, schema)
+    command_set, plan = load_command_set(COMMAND_SET_PATH)
 
     blocked = command_set["safety"]["blocked_keywords"]
 
@@ -166,6 +135,9 @@ def run_collector(
     run_dir = OUTPUT_ROOT / site / quarter / host / run_id
     artifacts_dir = run_dir / "artifacts"
     artifacts_dir.mkdir(parents=True, exist_ok=True)
+    # Artifact paths are plain strings built from this prefix, so the
+    # per-command loop allocates no Path objects.
+    artifact_prefix = str(artifacts_dir) + os.sep
 
     manifest = {
         "collector": {
@@ -183,170 +155,142 @@ def run_collector(
         "results": {}
     }
 
-    conn = connect_aruba_os(host, username, password)
-
-    paging_cmds = (
-        command_set
-        .get("transport", {})
-        .get("ssh", {})
-        .get("paging_disable", [])
+    # Artifact writes drain on a single background thread so disk I/O
+    # overlaps the next command's SSH round-trip. One thread keeps the
+    # writes in command order; nothing is opened with O_SYNC.
+    writer = ThreadPoolExecutor(
+        max_workers=1,
+        thread_name_prefix="artifact-writer"
     )
-    disable_paging(conn, paging_cmds)
 
-    for category, commands in command_set["commands"].items():
-        manifest["results"].setdefault(
-            category,
-            {"success": [], "failed": []}
-        )
-
-        cmd_index = 1
-        vlan_ids: List[int] = []
-
-        # -------------------------
-        # VLAN category handling
-        # -------------------------
-        if category == "vlans":
-            # 1) non-template first
-            for entry in commands:
-                template = entry["command"]
-                if "{{vlan_id}}" in template:
-                    continue
-
-                cmd = template
-                enforce_blocked_keywords(cmd, blocked)
-                result = execute_command(conn, cmd)
-
-                # correct naming
-                if cmd.strip() == "show vlan":
-                    artifact_path = artifacts_dir / "vlan_summary.txt"
-                else:
-                    artifact_path = artifacts_dir / f"{category}_{cmd_index}.txt"
+    conn = acquire_connection(host, username, password)
 
-                artifact_path.write_bytes(result["output"])
-                checksum = sha256_bytes(result["output"])
+    try:
+        paging_cmds = (
+            command_set
+            .get("transport", {})
+            .get("ssh", {})
+            .get("paging_disable", [])
+        )
+        disable_paging(conn, paging_cmds)
+
+        for category_plan in plan:
+            category = category_plan.category
+            manifest["results"].setdefault(
+                category,
+                {"success": [], "failed": []}
+            )
+
+            for _, cmd, name, result in iter_command_results(
+                conn, category_plan, blocked, vlan_batch_size
+            ):
+                artifact_path = artifact_prefix + name
+                checksum = writer.submit(
+                    write_artifact, artifact_path, result.output
+                )
 
                 manifest["artifacts"].append({
                     "category": category,
                     "command": cmd,
-                    "path": str(artifact_path),
+                    "path": artifact_path,
                     "checksum": checksum,
-                    "status": result["status"],
-                    "duration_ms": result["duration_ms"]
+                    "status": result.status,
+                    "duration_ms": result.duration_ms
                 })
 
-                if result["status"] == "success":
+                if result.status == "success":
                     manifest["results"][category]["success"].append(cmd)
-                    if cmd.strip() == "show vlan" and not vlan_ids:
-                        vlan_ids = extract_vlan_ids(result["output"])
                 else:
                     manifest["results"][category]["failed"].append(cmd)
-
-                cmd_index += 1
-
-            # 2) template per VLAN only
-            if vlan_ids:
-                for entry in commands:
-                    template = entry["command"]
-                    if "{{vlan_id}}" not in template:
-                        continue
-
-                    for vid in vlan_ids:
-                        cmd = render_command(template, {"vlan_id": vid})
-                        enforce_blocked_keywords(cmd, blocked)
-                        result = execute_command(conn, cmd)
-
-                        if "detail" in cmd:
-                            artifact_path = artifacts_dir / f"vlan_{vid}_detail.txt"
-                        else:
-                            artifact_path = artifacts_dir / f"vlan_{vid}.txt"
-
-                        artifact_path.write_bytes(result["output"])
-                        checksum = sha256_bytes(result["output"])
-
-                        manifest["artifacts"].append({
-                            "category": category,
-                            "command": cmd,
-                            "path": str(artifact_path),
-                            "checksum": checksum,
-                            "status": result["status"],
-                            "duration_ms": result["duration_ms"]
-                        })
-
-                        if result["status"] == "success":
-                            manifest["results"][category]["success"].append(cmd)
-                        else:
-                            manifest["results"][category]["failed"].append(cmd)
-
-                        cmd_index += 1
-
-            # *** FULL FIX — no fallthrough ***
-            continue
-
-
-        # -------------------------
-        # Default handling (non-VLAN)
-        # -------------------------
-        for entry in commands:
-            cmd = entry["command"]
-            enforce_blocked_keywords(cmd, blocked)
-
-            result = execute_command(conn, cmd)
-
-            artifact_path = artifacts_dir / f"{category}_{cmd_index}.txt"
-            artifact_path.write_bytes(result["output"])
-            checksum = sha256_bytes(result["output"])
-
-            manifest["artifacts"].append({
-                "category": category,
-                "command": cmd,
-                "path": str(artifact_path),
-                "checksum": checksum,
-                "status": result["status"],
-                "duration_ms": result["duration_ms"]
-            })
-
-            if result["status"] == "success":
-                manifest["results"][category]["success"].append(cmd)
-            else:
-                manifest["results"][category]["failed"].append(cmd)
-
-            cmd_index += 1
-
-    conn.disconnect()
+    except BaseException:
+        # the session may be mid-command; never hand it to the next run
+        _close_quietly(conn)
+        raise
+    else:
+        release_connection(host, username, password, conn)
+    finally:
+        # Checksums are futures until the writer has finished each file.
+        writer.shutdown(wait=True)
+
+    for artifact in manifest["artifacts"]:
+        artifact["checksum"] = artifact["checksum"].result()
 
     manifest_path = run_dir / "collector_manifest.json"
-    manifest_path.write_text(json.dumps(manifest, indent=2))
+    write_manifest(manifest_path, manifest)
 
     print("[OK] ArubaOS-Switch collection complete (clean)")
     print(f"     Artifacts: {artifacts_dir}")
     print(f"     Manifest : {manifest_path}")
 
 
+def run_collector_many(
+    targets: List[Dict[str, Any]],
+    max_workers: int = MAX_CONCURRENT_HOSTS
+) -> List[Tuple[Dict[str, Any], Optional[BaseException]]]:
+    """
+    Runs run_collector for each target dict concurrently.
+    Each run writes to its own run_id directory, so runs share no files.
+    """
+    return run_many(run_collector, targets, max_workers)
+
+
 # -------------------------
 # CLI
 # -------------------------
 
 def main():
     import argparse
+    import sys
 
     parser = argparse.ArgumentParser(
         description="ArubaOS-Switch Quarterly Collector (Evidence-Based)"
     )
-    parser.add_argument("--host", required=True)
+    hosts = parser.add_mutually_exclusive_group(required=True)
+    hosts.add_argument("--host")
+    hosts.add_argument(
+        "--hosts-file",
+        type=Path,
+        help="YAML/JSON list of hosts or target dicts; "
+             "missing keys default to the CLI values"
+    )
     parser.add_argument("--username", required=True)
     parser.add_argument("--password", required=True)
     parser.add_argument("--site", required=True)
     parser.add_argument("--quarter", required=True)
+    parser.add_argument(
+        "--vlan-batch-size",
+        type=int,
+        default=0,
+        help="paste per-VLAN commands in batches of N (0 = one at a time)"
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=MAX_CONCURRENT_HOSTS
+    )
 
     args = parser.parse_args()
 
-    run_collector(
-        host=args.host,
-        username=args.username,
-        password=args.password,
-        site=args.site,
-        quarter=args.quarter
-    )
+    defaults = {
+        "username": args.username,
+        "password": args.password,
+        "site": args.site,
+        "quarter": args.quarter,
+        "vlan_batch_size": args.vlan_batch_size
+    }
+
+    if args.host:
+        run_collector(host=args.host, **defaults)
+        return
+
+    try:
+        targets = build_targets(load_yaml(args.hosts_file), defaults)
+    except ValueError as exc:
+        parser.error(f"{args.hosts_file}: {exc}")
+
+    results = run_collector_many(targets, max_workers=args.max_workers)
+    if any(err is not None for _, err in results):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -15,16 +15,20 @@ Rules:
 - Always emits output
 """
 
-import json
 import sys
+from collections import defaultdict
 from pathlib import Path
-from datetime import datetime
+
+try:
+    from ._aruba_common import read_manifest, utc_timestamp, write_manifest
+except ImportError:
+    from _aruba_common import read_manifest, utc_timestamp, write_manifest
 
 
 def load_manifest(path: Path):
     if not path.exists():
         raise FileNotFoundError(f"Missing manifest: {path}")
-    return json.loads(path.read_text())
+    return read_manifest(path)
 
 
 def main():
@@ -39,7 +43,7 @@ def main():
     ctrl_manifest = load_manifest(ctrl_dir / "collector_manifest.json")
 
     result = {
-        "derived_at": datetime.utcnow().isoformat() + "Z",
+        "derived_at": utc_timestamp(),
         "source": {
             "ap_collector": ap_manifest.get("collector"),
             "ap_version": ap_manifest.get("collector_version"),
@@ -61,9 +65,10 @@ def main():
     )
 
     # Still record raw clients grouped by reported AP name
+    aps = defaultdict(list)
     for client in ctrl_manifest.get("clients", []):
-        ap_name = client.get("ap") or "UNKNOWN"
-        result["aps"].setdefault(ap_name, []).append(client)
+        aps[client.get("ap") or "UNKNOWN"].append(client)
+    result["aps"] = dict(aps)
 
     result["summary"]["aps_seen"] = len(result["aps"])
 
@@ -72,7 +77,7 @@ def main():
     derived_dir.mkdir(parents=True, exist_ok=True)
 
     out_path = derived_dir / "ap_client_correlation.json"
-    out_path.write_text(json.dumps(result, indent=2))
+    write_manifest(out_path, result)
 
     print("[OK] Derived AP → client correlation")
     print(f"     Output: {out_path}")
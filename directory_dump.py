@@ -1,39 +1,62 @@
 #!/usr/bin/env python3
 import os
+import shutil
 
 # --- CONFIG ---
 INPUT_DIR = "."                # directory to scan
 OUTPUT_FILE = "dump.txt"       # output file name
 EXCLUDE_DIRS = {"artifacts"}   # folders to skip
 EXCLUDE_FILES = {".DS_Store"}  # filenames to skip
+COPY_BUFFER = 1 << 20          # bytes per read/write when copying files
 # -----------------------------------------------
 
+def _dump_folder(folder, out, output_path):
+    try:
+        with os.scandir(folder) as it:
+            entries = list(it)
+    except OSError:
+        return
+
+    subdirs = []
+    for entry in entries:
+        # same split as os.walk: symlinked dirs are neither dumped
+        # nor descended into
+        if entry.is_dir():
+            if entry.name not in EXCLUDE_DIRS and not entry.is_symlink():
+                subdirs.append(entry.path)
+            continue
+
+        # skip excluded files (e.g., .DS_Store)
+        if entry.name in EXCLUDE_FILES:
+            continue
+
+        # skip output file to avoid infinite growth
+        if os.path.abspath(entry.path) == output_path:
+            continue
+
+        out.write(f"=== FILE: {entry.path} ===\n".encode("utf-8", "ignore"))
+        try:
+            # raw bytes straight through; no decode/encode round-trip
+            with open(entry.path, "rb") as f:
+                data = f.read(COPY_BUFFER)
+                out.write(data)
+                # a short first read already holds the whole file
+                if len(data) == COPY_BUFFER:
+                    shutil.copyfileobj(f, out, COPY_BUFFER)
+        except Exception as e:
+            out.write(f"[ERROR READING FILE: {e}]\n".encode("utf-8", "ignore"))
+
+        out.write(b"\n\n")
+
+    # files of a folder come before its subfolders, as with os.walk
+    for path in subdirs:
+        _dump_folder(path, out, output_path)
+
+
 def dump_directory_contents(root_dir, output_file):
-    with open(output_file, "w", encoding="utf-8", errors="ignore") as out:
-        for folder, subdirs, files in os.walk(root_dir):
-
-            # filter out excluded directories before descending
-            subdirs[:] = [d for d in subdirs if d not in EXCLUDE_DIRS]
-
-            for file in files:
-                # skip excluded files (e.g., .DS_Store)
-                if file in EXCLUDE_FILES:
-                    continue
-
-                file_path = os.path.join(folder, file)
-
-                # skip output file to avoid infinite growth
-                if os.path.abspath(file_path) == os.path.abspath(output_file):
-                    continue
-
-                out.write(f"=== FILE: {file_path} ===\n")
-                try:
-                    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                        out.write(f.read())
-                except Exception as e:
-                    out.write(f"[ERROR READING FILE: {e}]\n")
-                
-                out.write("\n\n")
+    output_path = os.path.abspath(output_file)
+    with open(output_file, "wb", buffering=COPY_BUFFER) as out:
+        _dump_folder(root_dir, out, output_path)
 
     print(f"✔ Finished! Output written to {output_file}")
 
@@ -0,0 +1,25 @@
+"""
+Blocked-keyword check for validate_command_set.py.
+
+A command is blocked when its lower-cased text contains any of the
+command set's safety.blocked_keywords. The matcher itself is the one
+the collectors use (collectors/_aruba_common.py).
+"""
+
+import sys
+from pathlib import Path
+
+try:
+    from collectors._aruba_common import find_blocked_keyword
+except ImportError:
+    # Run as a script: collectors/ lives at the repo root
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+    from collectors._aruba_common import find_blocked_keyword
+
+
+def enforce_blocked_keywords(command: str, blocked: list[str]) -> None:
+    word = find_blocked_keyword(command, blocked)
+    if word is not None:
+        raise ValueError(
+            f"Blocked keyword '{word}' detected in command: {command}"
+        )
@@ -0,0 +1,133 @@
+"""
+Compiled command-set schema validator shared by command_probe.py and
+validate_command_set.py.
+
+The schema is parsed, checked against its metaschema and compiled
+once per process; edits are picked up on the next call via mtime.
+jsonschema-rs is used when installed, with jsonschema as fallback.
+
+get_safety_validator additionally folds a blocked-keyword set into
+the "command" schema, so one is_valid() call checks both structure
+and safety.
+"""
+
+import functools
+import json
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+from jsonschema import Draft202012Validator
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from jsonschema_rs import Draft202012Validator as RustValidator
+except ImportError:
+    RustValidator = None
+
+
+SCHEMA_PATH = Path("schemas/command_set.schema.json")
+
+
+def load_schema(path: Path = SCHEMA_PATH) -> Dict[str, Any]:
+    if orjson is not None:
+        return orjson.loads(path.read_bytes())
+    with path.open() as f:
+        return json.load(f)
+
+
+@functools.lru_cache(maxsize=4)
+def _load_validator(path: str, mtime_ns: int):
+    schema = load_schema(Path(path))
+    Draft202012Validator.check_schema(schema)
+    if RustValidator is not None:
+        return RustValidator(schema)
+    return Draft202012Validator(schema)
+
+
+def get_validator(path: Path = SCHEMA_PATH):
+    """Compiled validator; both backends expose is_valid/iter_errors."""
+    return _load_validator(str(path), path.stat().st_mtime_ns)
+
+
+# Non-ASCII characters that str.lower() turns into an ASCII letter
+_LOWER_ALIASES = {"i": "\u0130", "k": "\u212a"}
+_REGEX_SYNTAX = set("^$\\.*+?()[]{}|/")
+
+
+def blocked_keywords_pattern(blocked: Tuple[str, ...]) -> Optional[str]:
+    """
+    A schema "pattern" matching every command whose lower() contains
+    a blocked keyword. Case folding is spelled out as character
+    classes, since JSON Schema regexes have no inline flags. Returns
+    None for non-ASCII keywords, which are left to the runtime check.
+    """
+    alternatives = []
+    for word in blocked:
+        if not word.isascii():
+            return None
+        parts = []
+        for ch in word:
+            if ch.isalpha():
+                low = ch.lower()
+                alias = _LOWER_ALIASES.get(low, "")
+                parts.append(f"[{low}{low.upper()}{alias}]")
+            elif ch in _REGEX_SYNTAX:
+                parts.append("\\" + ch)
+            else:
+                parts.append(ch)
+        alternatives.append("".join(parts))
+    return "|".join(alternatives)
+
+
+@functools.lru_cache(maxsize=8)
+def _load_safety_validator(path: str, mtime_ns: int, pattern: str):
+    schema = load_schema(Path(path))
+    entry = schema["$defs"]["commandList"]["items"]
+    entry["properties"]["command"]["not"] = {"pattern": pattern}
+    Draft202012Validator.check_schema(schema)
+    if RustValidator is not None:
+        return RustValidator(schema)
+    return Draft202012Validator(schema)
+
+
+def get_safety_validator(
+    blocked: Tuple[str, ...],
+    path: Path = SCHEMA_PATH
+):
+    """
+    Validator for the schema plus "no command contains a blocked
+    keyword", compiled once per keyword set. Valid under it implies
+    valid under get_validator() and the runtime keyword check; None
+    if the keywords cannot be expressed as a schema pattern.
+    """
+    pattern = blocked_keywords_pattern(blocked)
+    if pattern is None:
+        return None
+    return _load_safety_validator(
+        str(path), path.stat().st_mtime_ns, pattern
+    )
+
+
+def schema_errors(
+    data: Dict[str, Any],
+    path: Path = SCHEMA_PATH
+) -> List[Tuple[List[Any], str]]:
+    """Returns (instance path, message) pairs sorted by path."""
+    validator = get_validator(path)
+    # jsonschema-rs reports the location as instance_path,
+    # jsonschema as path
+    if RustValidator is not None:
+        errors = [
+            (list(err.instance_path), err.message)
+            for err in validator.iter_errors(data)
+        ]
+    else:
+        errors = [
+            (list(err.path), err.message)
+            for err in validator.iter_errors(data)
+        ]
+    return sorted(errors, key=lambda e: e[0])
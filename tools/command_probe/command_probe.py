@@ -10,31 +10,92 @@ Fixed version that:
 This is a full replacement file.
 """
 
+import functools
 import json
+import os
+import sys
 import uuid
 import yaml
 import hashlib
-import time
-import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime, timezone
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+try:
+    from collectors._aruba_common import (
+        MAX_CONCURRENT_HOSTS,
+        build_targets,
+        run_many,
+    )
+    from collectors._aos_switch import (
+        CategoryPlan,
+        _close_quietly,
+        acquire_connection,
+        build_command_plan,
+        connect_aruba_os,
+        disable_paging,
+        iter_command_results,
+        release_connection,
+    )
+except ImportError:
+    # Run as a script: the switch run logic lives in collectors/ at
+    # the repo root
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+    from collectors._aruba_common import (
+        MAX_CONCURRENT_HOSTS,
+        build_targets,
+        run_many,
+    )
+    from collectors._aos_switch import (
+        CategoryPlan,
+        _close_quietly,
+        acquire_connection,
+        build_command_plan,
+        connect_aruba_os,
+        disable_paging,
+        iter_command_results,
+        release_connection,
+    )
 
-from jsonschema import Draft202012Validator
-from netmiko import ConnectHandler
-from jinja2 import Template
+try:
+    from ._schema_cache import get_validator, schema_errors
+except ImportError:
+    from _schema_cache import get_validator, schema_errors
+
+try:
+    from yaml import CSafeLoader as YamlSafeLoader
+except ImportError:
+    from yaml import SafeLoader as YamlSafeLoader
 
 
 # -------------------------
 # Configuration
 # -------------------------
 
-SCHEMA_PATH = Path("schemas/command_set.schema.json")
 OUTPUT_ROOT = Path("tools/command_probe/output")
 
 TOOL_NAME = "command_probe"
 TOOL_VERSION = "0.5.0"
 
+# Hash and write in cache-sized slices so each slice is read from
+# memory once.
+WRITE_CHUNK_BYTES = 64 * 1024
+
+# Artifact checksum algorithm; "blake3" needs the blake3 package.
+CHECKSUM_ALGOS = ("sha256", "blake3")
+DEFAULT_CHECKSUM_ALGO = "sha256"
+
 
 # -------------------------
 # Helpers
@@ -44,126 +105,169 @@ def now_utc() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
-def sha256_bytes(data: bytes) -> str:
-    return "sha256:" + hashlib.sha256(data).hexdigest()
+def _new_hasher(algo: str):
+    if algo == "sha256":
+        return hashlib.sha256()
+    if algo == "blake3":
+        if blake3 is None:
+            raise ValueError("blake3 checksums require the blake3 package")
+        return blake3.blake3()
+    raise ValueError(f"Unsupported checksum algorithm: {algo}")
 
 
-def load_yaml(path: Path) -> Dict[str, Any]:
-    with path.open() as f:
-        return yaml.safe_load(f)
-
-
-def load_schema() -> Dict[str, Any]:
-    with SCHEMA_PATH.open() as f:
-        return json.load(f)
+def write_artifact(
+    path: str,
+    data: bytes,
+    algo: str = DEFAULT_CHECKSUM_ALGO
+) -> str:
+    """
+    Hash and write command output in one pass over the buffer.
+    Returns the "<algo>:<hex>" checksum of the bytes written.
+    """
+    digest = _new_hasher(algo)
+    view = memoryview(data)
+    # Raw descriptor: open/write/close only, without the fstat/ioctl
+    # and buffer setup of a file object.
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        for start in range(0, len(view), WRITE_CHUNK_BYTES):
+            chunk = view[start:start + WRITE_CHUNK_BYTES]
+            digest.update(chunk)
+            # os.write may write short; resume from the first unwritten byte
+            while chunk:
+                chunk = chunk[os.write(fd, chunk):]
+    finally:
+        os.close(fd)
+    return f"{algo}:{digest.hexdigest()}"
 
 
-def validate_schema(data: Dict[str, Any], schema: Dict[str, Any]) -> None:
-    validator = Draft202012Validator(schema)
-    errors = sorted(validator.iter_errors(data), key=lambda e: e.path)
-    if errors:
-        for err in errors:
-            print(f"[SCHEMA ERROR] {list(err.path)}: {err.message}")
-        raise SystemExit(1)
+def _json_loads(raw: bytes):
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
 
 
-def enforce_blocked_keywords(command: str, blocked: list[str]) -> None:
-    lowered = command.lower()
-    for word in blocked:
-        if word in lowered:
-            raise ValueError(
-                f"Blocked keyword '{word}' detected in command: {command}"
-            )
+def _json_dumps(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data).encode()
 
 
-def render_command(template_str: str, context: Dict[str, Any]) -> str:
-    """Render Jinja-style {{ variables }} in command templates."""
-    return Template(template_str).render(**context)
+def _read_yaml_sidecar(sidecar: str, mtime_ns: int, digest: str):
+    try:
+        with open(sidecar, "rb") as f:
+            cached = _json_loads(f.read())
+    except (OSError, ValueError):
+        return None
+    if (
+        not isinstance(cached, dict)
+        or cached.get("mtime_ns") != mtime_ns
+        or cached.get("sha256") != digest
+    ):
+        return None
+    return cached.get("data")
+
+
+def _write_yaml_sidecar(sidecar: str, mtime_ns: int, digest: str, data) -> None:
+    try:
+        encoded = _json_dumps(data)
+    except (TypeError, ValueError):
+        return
+    # Only cache documents JSON represents exactly (no int keys, dates, ...)
+    if _json_loads(encoded) != data:
+        return
+
+    payload = _json_dumps({"mtime_ns": mtime_ns, "sha256": digest, "data": data})
+    tmp = f"{sidecar}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(payload)
+        os.replace(tmp, sidecar)
+    except OSError:
+        # Read-only checkout etc.; the sidecar is only an optimization
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
 
 
-def extract_vlan_ids(output_bytes: bytes) -> List[int]:
+@functools.lru_cache(maxsize=8)
+def _load_yaml(path: str, mtime_ns: int) -> Dict[str, Any]:
     """
-    Extract VLAN IDs from 'show vlan' output.
-    Matches:
-      '  1   DEFAULT_VLAN ...'
-      ' 200  DLR_SERVER_VLAN ...'
+    Parses a YAML command set, going through a <path>.json sidecar that
+    is trusted only while both the YAML's mtime and sha256 match.
     """
-    text = output_bytes.decode(errors="ignore")
-    ids: List[int] = []
-    for match in re.finditer(r"^\s*(\d+)\s+", text, flags=re.MULTILINE):
-        try:
-            ids.append(int(match.group(1)))
-        except ValueError:
-            continue
-    return ids
-
-
-# -------------------------
-# SSH Execution (Timing-Safe)
-# -------------------------
+    with open(path, "rb") as f:
+        raw = f.read()
+    digest = hashlib.sha256(raw).hexdigest()
+    sidecar = path + ".json"
 
-def connect_aruba_os(host: str, username: str, password: str):
-    return ConnectHandler(
-        device_type="aruba_os",
-        host=host,
-        username=username,
-        password=password,
-        fast_cli=False
-    )
+    data = _read_yaml_sidecar(sidecar, mtime_ns, digest)
+    if data is None:
+        data = yaml.load(raw, Loader=YamlSafeLoader)
+        _write_yaml_sidecar(sidecar, mtime_ns, digest, data)
+    return data
 
 
-def disable_paging(conn, commands: list[str]):
-    for cmd in commands:
-        conn.send_command_timing(cmd)
-        time.sleep(0.3)
+def load_yaml(path: Path) -> Dict[str, Any]:
+    # Parsed once per (path, mtime); the result is shared, so read-only
+    return _load_yaml(str(path), path.stat().st_mtime_ns)
 
 
-def flush_channel(conn):
-    """Drain any residual output before issuing the next command."""
-    time.sleep(0.2)
-    conn.read_channel()
+def write_manifest(path: Path, manifest: Dict[str, Any]) -> None:
+    if orjson is not None:
+        # Encoded straight to UTF-8 bytes in C
+        path.write_bytes(orjson.dumps(manifest, option=orjson.OPT_INDENT_2))
+        return
 
+    # Stdlib fallback: stream encoder chunks so the whole document is
+    # never materialized as one string.
+    encoder = json.JSONEncoder(indent=2)
+    with path.open("w", encoding="utf-8") as f:
+        f.writelines(encoder.iterencode(manifest))
 
-def execute_command(conn, command: str) -> Dict[str, Any]:
-    flush_channel(conn)
 
-    start = time.time()
-    try:
-        output = conn.send_command_timing(
-            command,
-            strip_prompt=False,
-            strip_command=False
-        )
-        status = "success" if output.strip() else "empty"
-        error = None
-    except Exception as e:
-        output = str(e)
-        status = "failed"
-        error = str(e)
-
-    duration = int((time.time() - start) * 1000)
-
-    return {
-        "status": status,
-        "output": output.encode(),
-        "error": error,
-        "duration_ms": duration
-    }
+def validate_schema(data: Dict[str, Any]) -> None:
+    validator = get_validator()
+    if validator.is_valid(data):
+        return
+    for path, message in schema_errors(data):
+        print(f"[SCHEMA ERROR] {path}: {message}")
+    raise SystemExit(1)
 
 
 # -------------------------
 # Probe Core
 # -------------------------
 
+@functools.lru_cache(maxsize=8)
+def _command_plan(path: str, mtime_ns: int) -> Tuple[CategoryPlan, ...]:
+    return build_command_plan(_load_yaml(path, mtime_ns))
+
+
+def load_command_set(path: Path):
+    """
+    Loads and validates a command set and returns (command_set, plan).
+    Both are cached per (path, mtime) and shared, so read-only.
+    """
+    key = (str(path), path.stat().st_mtime_ns)
+    command_set = _load_yaml(*key)
+    validate_schema(command_set)
+    return command_set, _command_plan(*key)
+
+
 def run_probe(
     command_set_path: Path,
     host: str,
     username: str,
-    password: str
+    password: str,
+    vlan_batch_size: int = 0,
+    command_batch_size: int = 0,
+    reuse_connection: bool = True,
+    checksum_algo: str = DEFAULT_CHECKSUM_ALGO
 ) -> None:
-    schema = load_schema()
-    command_set = load_yaml(command_set_path)
-    validate_schema(command_set, schema)
+    # fail before connecting, not on the first artifact
+    _new_hasher(checksum_algo)
+
+    command_set, plan = load_command_set(command_set_path)
 
     blocked = command_set["safety"]["blocked_keywords"]
 
@@ -171,6 +275,9 @@ def run_probe(
     probe_dir = OUTPUT_ROOT / probe_id
     artifacts_dir = probe_dir / "artifacts"
     artifacts_dir.mkdir(parents=True, exist_ok=True)
+    # Artifact paths are plain strings built from this prefix, so the
+    # per-command loop allocates no Path objects.
+    artifact_prefix = str(artifacts_dir) + os.sep
 
     manifest = {
         "probe_id": probe_id,
@@ -189,173 +296,106 @@ def run_probe(
         },
         "safety": command_set["safety"],
         "command_attempts": [],
-        "results": {},
+        # categories are known from the plan; build them up front
+        "results": {
+            category_plan.category: {"supported": [], "unsupported": []}
+            for category_plan in plan
+        },
         "artifacts": []
     }
 
-    conn = connect_aruba_os(host, username, password)
-
-    paging_cmds = (
-        command_set
-        .get("transport", {})
-        .get("ssh", {})
-        .get("paging_disable", [])
+    # Artifact writes drain on a single background thread so disk I/O
+    # overlaps the next command's SSH round-trip. One thread keeps the
+    # writes in command order.
+    writer = ThreadPoolExecutor(
+        max_workers=1,
+        thread_name_prefix="artifact-writer"
     )
-    disable_paging(conn, paging_cmds)
 
-    for category, commands in command_set["commands"].items():
-        manifest["results"].setdefault(
-            category,
-            {"supported": [], "unsupported": []}
-        )
-
-        cmd_index = 1
-        vlan_ids: List[int] = []
-
-        # -------------------------
-        # VLAN category handling
-        # -------------------------
-        if category == "vlans":
-            # 1) Run non-template VLAN commands first (before expansion)
-            for entry in commands:
-                template = entry["command"]
-                if "{{vlan_id}}" in template:
-                    continue
-
-                cmd = template
-                enforce_blocked_keywords(cmd, blocked)
-                result = execute_command(conn, cmd)
-
-                # Naming for summary vs others
-                if cmd.strip() == "show vlan":
-                    artifact_path = artifacts_dir / "vlan_summary.txt"
-                else:
-                    artifact_path = artifacts_dir / f"{category}_{cmd_index}.txt"
+    if reuse_connection:
+        conn = acquire_connection(host, username, password)
+    else:
+        conn = connect_aruba_os(host, username, password)
 
-                artifact_path.write_bytes(result["output"])
-                checksum = sha256_bytes(result["output"])
+    try:
+        paging_cmds = (
+            command_set
+            .get("transport", {})
+            .get("ssh", {})
+            .get("paging_disable", [])
+        )
+        disable_paging(conn, paging_cmds)
+
+        for category_plan in plan:
+            category = category_plan.category
+            supported = manifest["results"][category]["supported"]
+            unsupported = manifest["results"][category]["unsupported"]
+
+            for cmd_index, cmd, name, result in iter_command_results(
+                conn, category_plan, blocked,
+                vlan_batch_size, command_batch_size
+            ):
+                artifact_path = artifact_prefix + name
+                checksum = writer.submit(
+                    write_artifact, artifact_path, result.output, checksum_algo
+                )
 
                 manifest["command_attempts"].append({
                     "command": cmd,
                     "category": category,
                     "attempt_index": cmd_index,
-                    "status": result["status"],
-                    "duration_ms": result["duration_ms"],
-                    "error": result["error"],
-                    "artifact_path": str(artifact_path)
+                    "status": result.status,
+                    "duration_ms": result.duration_ms,
+                    "error": result.error,
+                    "artifact_path": artifact_path
                 })
 
                 manifest["artifacts"].append({
-                    "path": str(artifact_path),
+                    "path": artifact_path,
                     "command": cmd,
                     "category": category,
                     "checksum": checksum
                 })
 
-                if result["status"] == "success":
-                    manifest["results"][category]["supported"].append(cmd)
-                    # extract only once
-                    if cmd.strip() == "show vlan" and not vlan_ids:
-                        vlan_ids = extract_vlan_ids(result["output"])
+                if result.status == "success":
+                    supported.append(cmd)
                 else:
-                    manifest["results"][category]["unsupported"].append(cmd)
-
-                cmd_index += 1
-
-            # 2) Template expansion — generate per-VLAN artifacts
-            if vlan_ids:
-                for entry in commands:
-                    template = entry["command"]
-                    if "{{vlan_id}}" not in template:
-                        continue
-
-                    for vid in vlan_ids:
-                        cmd = render_command(template, {"vlan_id": vid})
-                        enforce_blocked_keywords(cmd, blocked)
-                        result = execute_command(conn, cmd)
-
-                        if "detail" in cmd:
-                            artifact_path = artifacts_dir / f"vlan_{vid}_detail.txt"
-                        else:
-                            artifact_path = artifacts_dir / f"vlan_{vid}.txt"
-
-                        artifact_path.write_bytes(result["output"])
-                        checksum = sha256_bytes(result["output"])
-
-                        manifest["command_attempts"].append({
-                            "command": cmd,
-                            "category": category,
-                            "attempt_index": cmd_index,
-                            "status": result["status"],
-                            "duration_ms": result["duration_ms"],
-                            "error": result["error"],
-                            "artifact_path": str(artifact_path)
-                        })
-
-                        manifest["artifacts"].append({
-                            "path": str(artifact_path),
-                            "command": cmd,
-                            "category": category,
-                            "checksum": checksum
-                        })
-
-                        if result["status"] == "success":
-                            manifest["results"][category]["supported"].append(cmd)
-                        else:
-                            manifest["results"][category]["unsupported"].append(cmd)
-
-                        cmd_index += 1
-
-            # *** FIX: do not fall through to default handlers ***
-            continue
-
-
-        # -------------------------
-        # Default handling (non-VLAN)
-        # -------------------------
-        for entry in commands:
-            cmd = entry["command"]
-            enforce_blocked_keywords(cmd, blocked)
-
-            result = execute_command(conn, cmd)
-
-            artifact_path = artifacts_dir / f"{category}_{cmd_index}.txt"
-            artifact_path.write_bytes(result["output"])
-            checksum = sha256_bytes(result["output"])
-
-            manifest["command_attempts"].append({
-                "command": cmd,
-                "category": category,
-                "attempt_index": cmd_index,
-                "status": result["status"],
-                "duration_ms": result["duration_ms"],
-                "error": result["error"],
-                "artifact_path": str(artifact_path)
-            })
-
-            manifest["artifacts"].append({
-                "path": str(artifact_path),
-                "command": cmd,
-                "category": category,
-                "checksum": checksum
-            })
-
-            if result["status"] == "success":
-                manifest["results"][category]["supported"].append(cmd)
-            else:
-                manifest["results"][category]["unsupported"].append(cmd)
-
-            cmd_index += 1
-
-    conn.disconnect()
+                    unsupported.append(cmd)
+    except BaseException:
+        # the session may be mid-command; never hand it to the next run
+        _close_quietly(conn)
+        raise
+    else:
+        if reuse_connection:
+            release_connection(host, username, password, conn)
+        else:
+            _close_quietly(conn)
+    finally:
+        # Checksums are futures until the writer has finished each file.
+        writer.shutdown(wait=True)
+
+    for artifact in manifest["artifacts"]:
+        artifact["checksum"] = artifact["checksum"].result()
 
     manifest_path = probe_dir / "probe_manifest.json"
-    manifest_path.write_text(json.dumps(manifest, indent=2))
+    write_manifest(manifest_path, manifest)
 
     print("[OK] Probe complete — VLAN-expanded & cleaned")
     print(f"     Manifest: {manifest_path}")
 
 
+def probe_hosts(
+    targets: List[Dict[str, Any]],
+    max_workers: int = MAX_CONCURRENT_HOSTS
+) -> List[Tuple[Dict[str, Any], Optional[BaseException]]]:
+    """
+    Runs run_probe for each target dict concurrently.
+    Each probe writes to its own probe_id directory, so probes share
+    no files.
+    """
+    return run_many(run_probe, targets, max_workers)
+
+
 # -------------------------
 # CLI
 # -------------------------
@@ -367,18 +407,67 @@ def main():
         description="ArubaOS-Switch Command Probe (Timing-Safe, Read-Only)"
     )
     parser.add_argument("--command-set", required=True)
-    parser.add_argument("--host", required=True)
+    hosts = parser.add_mutually_exclusive_group(required=True)
+    hosts.add_argument("--host")
+    hosts.add_argument(
+        "--hosts-file",
+        type=Path,
+        help="YAML/JSON list of hosts or target dicts; "
+             "missing keys default to the CLI values"
+    )
     parser.add_argument("--username", required=True)
     parser.add_argument("--password", required=True)
+    parser.add_argument(
+        "--vlan-batch-size",
+        type=int,
+        default=0,
+        help="paste per-VLAN commands in batches of N (0 = one at a time)"
+    )
+    parser.add_argument(
+        "--command-batch-size",
+        type=int,
+        default=0,
+        help="paste each category's commands in batches of N "
+             "(0 = one at a time)"
+    )
+    parser.add_argument(
+        "--checksum-algo",
+        choices=CHECKSUM_ALGOS,
+        default=DEFAULT_CHECKSUM_ALGO,
+        help="artifact checksum algorithm (blake3 needs the blake3 package)"
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=MAX_CONCURRENT_HOSTS
+    )
 
     args = parser.parse_args()
 
-    run_probe(
-        Path(args.command_set),
-        args.host,
-        args.username,
-        args.password
-    )
+    defaults = {
+        "command_set_path": Path(args.command_set),
+        "username": args.username,
+        "password": args.password,
+        "vlan_batch_size": args.vlan_batch_size,
+        "command_batch_size": args.command_batch_size,
+        "checksum_algo": args.checksum_algo
+    }
+
+    if args.host:
+        run_probe(host=args.host, **defaults)
+        return
+
+    with args.hosts_file.open("rb") as f:
+        hosts_list = yaml.load(f, Loader=YamlSafeLoader)
+
+    try:
+        targets = build_targets(hosts_list, defaults)
+    except ValueError as exc:
+        parser.error(f"{args.hosts_file}: {exc}")
+
+    results = probe_hosts(targets, max_workers=args.max_workers)
+    if any(err is not None for _, err in results):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
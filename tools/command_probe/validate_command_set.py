@@ -1,33 +1,57 @@
-import json
 import sys
 import yaml
-from jsonschema import Draft202012Validator
 
-SCHEMA_PATH = "schemas/command_set.schema.json"
+try:
+    from yaml import CSafeLoader as YamlSafeLoader
+except ImportError:
+    from yaml import SafeLoader as YamlSafeLoader
 
+try:
+    from ._safety import enforce_blocked_keywords
+except ImportError:
+    from _safety import enforce_blocked_keywords
 
-def enforce_blocked_keywords(command: str, blocked: list[str]):
-    lowered = command.lower()
-    for word in blocked:
-        if word in lowered:
-            raise ValueError(
-                f"Blocked keyword '{word}' detected in command: {command}"
-            )
+try:
+    from ._schema_cache import (
+        get_safety_validator, get_validator, schema_errors
+    )
+except ImportError:
+    from _schema_cache import (
+        get_safety_validator, get_validator, schema_errors
+    )
 
 
-def main(path):
-    with open(SCHEMA_PATH) as f:
-        schema = json.load(f)
+def _blocked_keywords(data):
+    """The command set's blocked keywords as a tuple, if well-formed."""
+    try:
+        blocked = data["safety"]["blocked_keywords"]
+    except (KeyError, TypeError):
+        return None
+    if not isinstance(blocked, list):
+        return None
+    if not all(isinstance(word, str) for word in blocked):
+        return None
+    return tuple(blocked)
+
 
-    with open(path) as f:
-        data = yaml.safe_load(f)
+def main(path):
+    with open(path, "rb") as f:
+        data = yaml.load(f, Loader=YamlSafeLoader)
 
-    validator = Draft202012Validator(schema)
-    errors = sorted(validator.iter_errors(data), key=lambda e: e.path)
+    # Fast path: structure and blocked keywords in one validator call.
+    # Anything it rejects is re-checked below for exact reporting.
+    blocked = _blocked_keywords(data)
+    if blocked is not None:
+        validator = get_safety_validator(blocked)
+        if validator is not None and validator.is_valid(data):
+            print(f"[OK] Command set '{path}' is valid and safe.")
+            return
 
-    if errors:
-        for err in errors:
-            print(f"[SCHEMA ERROR] {list(err.path)}: {err.message}")
+    # is_valid short-circuits; errors are only collected and sorted
+    # for a command set that actually fails
+    if not get_validator().is_valid(data):
+        for err_path, message in schema_errors(data):
+            print(f"[SCHEMA ERROR] {err_path}: {message}")
         sys.exit(1)
 
     blocked = data["safety"]["blocked_keywords"]